@@ -3,33 +3,227 @@
 from __future__ import annotations
 
 import argparse
+import concurrent.futures
+import errno
+import functools
+import itertools
 import json
+import math
 import os, sys
 import re
 import shutil 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-INVALID_WIN_RE = re.compile(r'[<>:"/\\|?*\u0000-\u001F]')
+try:
+    import ijson  # type: ignore  # optional: streams large exports
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # type: ignore  # optional: faster JSON encode/decode
+except ImportError:
+    orjson = None
+
+
+def _json_dumpb_std(obj: Any) -> bytes:
+    # compact, like orjson, so the bytes (and tag_mp4_file's skip-save check) don't depend on which is installed
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _has_nonfinite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(v) for v in obj)
+    return False
+
+
+if orjson is not None:
+    # orjson reads integers beyond 64 bits as floats, refuses to write them and
+    # writes NaN/Infinity as null; anything that might hold one goes through the
+    # stdlib instead (19 digits: int64 ends at 9223372036854775807)
+    _BIG_INT_RE = re.compile(rb"\d{19}")
+
+    def json_dumpb(obj: Any) -> bytes:
+        try:
+            b = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return _json_dumpb_std(obj)
+        # non-finite floats come out as null, so only then is the walk needed
+        if b"null" in b and _has_nonfinite(obj):
+            return _json_dumpb_std(obj)
+        return b
+
+    def json_loads(b: bytes) -> Any:
+        if not _BIG_INT_RE.search(b):
+            try:
+                return orjson.loads(b)
+            except orjson.JSONDecodeError:
+                pass  # let json report it (or decode what orjson won't)
+        return json.loads(b)
+else:
+    json_dumpb = _json_dumpb_std
+    json_loads = json.loads
+
+# illegal chars (Windows + path separators + control chars) -> "_", for str.translate
+INVALID_WIN_TABLE = {ord(c): "_" for c in '<>:"/\\|?*'}
+INVALID_WIN_TABLE.update({i: "_" for i in range(0x20)})
 WS_RE = re.compile(r"\s+")
+WS_US_RE = re.compile(r"[\s_]+")  # whitespace and underscore runs, collapsed in one pass
 
-WIN_RESERVED = {
+WIN_RESERVED = frozenset({
     "CON", "PRN", "AUX", "NUL",
     *(f"COM{i}" for i in range(1, 10)),
     *(f"LPT{i}" for i in range(1, 10)),
-}
+})
 
 
 # -------------------------
 # JSON loading
 # -------------------------
 def load_alltihop_json(path: Path) -> Dict[str, Any]:
-    raw = path.read_text(encoding="utf-8", errors="replace").strip()
-    if raw.startswith("alltihop="):
-        raw = raw[len("alltihop="):]
-    raw = raw.strip().rstrip(";")
-    return json.loads(raw)
+    # "alltihop={...};" -> slice out the object by byte offsets, no text pass over the file
+    b = path.read_bytes()
+    i, j = b.find(b"{"), b.rfind(b"}")
+    if i < 0 or j < i:
+        raise ValueError(f"no JSON object found in {path.name}")
+    raw = b[i:j + 1]
+    try:
+        return json_loads(raw)
+    except UnicodeDecodeError:
+        return json.loads(raw.decode("utf-8", errors="replace"))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_alltihop_json_cached(path: Path) -> Dict[str, Any]:
+    # fallback without ijson: user + pieces are read from one full parse
+    return load_alltihop_json(path)
+
+
+class _JsonpReader:
+    """
+    Binary reader over the JSON object inside "alltihop=...;",
+    i.e. from the first '{' to the last '}' of the file.
+    """
+
+    def __init__(self, path: Path, tail: int = 4096) -> None:
+        self._f = path.open("rb")
+        size = self._f.seek(0, os.SEEK_END)
+        self._f.seek(max(0, size - tail))
+        end = self._f.read().rfind(b"}")
+        end = size if end < 0 else max(0, size - tail) + end + 1
+
+        self._f.seek(0)
+        start = self._f.read(tail).find(b"{")
+        start = 0 if start < 0 else start
+        self._f.seek(start)
+        self._left = end - start
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0 or n > self._left:
+            n = self._left
+        b = self._f.read(n)
+        self._left -= len(b)
+        return b
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "_JsonpReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def read_user(path: Path) -> Dict[str, Any]:
+    """The export's "user" block (stops parsing as soon as it is read when ijson is available)."""
+    if ijson is not None:
+        try:
+            with _JsonpReader(path) as f:
+                user = next(ijson.items(f, "user", use_float=True), None)
+            return user if isinstance(user, dict) else {}
+        except ijson.JSONError:
+            pass  # e.g. yajl2_c "integer overflow": use the full stdlib parse below
+    data = _load_alltihop_json_cached(path)
+    user = data.get("user") if isinstance(data, dict) else None
+    return user if isinstance(user, dict) else {}
+
+
+class MetadataError(ValueError):
+    """Malformed export metadata found while pieces are already being iterated."""
+
+
+def _pieces_list(path: Path) -> List[Dict[str, Any]]:
+    data = _load_alltihop_json_cached(path)
+    pieces = data.get("pieces") if isinstance(data, dict) else None
+    if not isinstance(pieces, list):
+        raise ValueError("expected key 'pieces' to be a list")
+    return pieces
+
+
+def iter_pieces(path: Path, *, check_all: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate the export's "pieces" list.
+    With ijson installed pieces are streamed one at a time, so peak memory stays
+    flat for large exports and work can start before the parser finishes;
+    otherwise the whole file is parsed up front.
+    Raises ValueError right away if "pieces" is missing or not a list. A syntax
+    error further into a stream raises MetadataError during iteration, unless
+    check_all asks for a full syntax pass first (for callers that must not be
+    interrupted halfway, e.g. tag --apply).
+    """
+    if ijson is not None:
+        try:
+            if check_all:
+                _check_stream(path)
+            return _stream_pieces(path)
+        except ijson.JSONError:
+            pass  # not streamable (e.g. yajl2_c "integer overflow"): full stdlib parse below
+    return iter(_pieces_list(path))
+
+
+def _check_stream(path: Path) -> None:
+    """One event-level ijson pass over the whole file (no objects are built); raises ijson.JSONError."""
+    with _JsonpReader(path) as f:
+        for _ in ijson.parse(f, use_float=True):
+            pass
+
+
+def _stream_pieces(path: Path) -> Iterator[Dict[str, Any]]:
+    # short event pass up to where "pieces" starts, so a missing/non-array value
+    # is reported before iteration; the pieces themselves come from ijson's
+    # native items() on a fresh reader, which is much faster than feeding it events
+    with _JsonpReader(path) as f:
+        for prefix, event, _ in ijson.parse(f, use_float=True):
+            if prefix == "pieces":
+                break
+        else:
+            event = None
+    if event != "start_array":
+        raise ValueError("expected key 'pieces' to be a list")
+    return _stream_items(path)
+
+
+def _stream_items(path: Path) -> Iterator[Dict[str, Any]]:
+    n = 0
+    try:
+        with _JsonpReader(path) as f:
+            for piece in ijson.items(f, "pieces.item", use_float=True):
+                n += 1
+                yield piece
+        return
+    except ijson.JSONError:
+        pass  # e.g. yajl2_c "integer overflow": continue from a full stdlib parse
+    try:
+        pieces = _pieces_list(path)
+    except ValueError as e:
+        raise MetadataError(str(e)) from None
+    yield from itertools.islice(pieces, n, None)
 
 
 # -------------------------
@@ -41,19 +235,24 @@ def safe_filename_base(s: str, *, max_len: int = 180, preserve_blanks: bool = Fa
     Default: replace whitespace with underscores.
     With preserve_blanks=True: keep spaces (normalized).
     """
-    s = (s or "").strip()
+    return _safe_filename_base(s or "", max_len, preserve_blanks)
+
+
+@functools.lru_cache(maxsize=4096)
+def _safe_filename_base(s: str, max_len: int, preserve_blanks: bool) -> str:
+    # memoized: the username and duplicate titles are sanitized once per run
+    s = s.strip()
 
     if preserve_blanks:
         s = WS_RE.sub(" ", s)   # normalize to single space
     else:
-        s = WS_RE.sub("_", s)   # linux-style: whitespace -> underscore
-        s = re.sub(r"_+", "_", s)  # collapse runs of underscores
+        s = WS_US_RE.sub("_", s)   # linux-style: whitespace/underscore runs -> single underscore
 
     if not s:
         s = "untitled"
 
     # replace illegal chars (Windows + path separators + control chars)
-    s = INVALID_WIN_RE.sub("_", s)
+    s = s.translate(INVALID_WIN_TABLE)
 
     # remove trailing dots/spaces (Windows)
     s = s.rstrip(" .")
@@ -69,31 +268,135 @@ def safe_filename_base(s: str, *, max_len: int = 180, preserve_blanks: bool = Fa
     return s or "untitled"
 
 
-def unique_path(p: Path) -> Path:
-    """If p exists, append __2, __3, ... before suffix."""
-    if not p.exists():
+def unique_path(p: Path, existing: Set[str]) -> Path:
+    """
+    If p's name is taken, append __2, __3, ... before suffix.
+    existing holds the names in p's folder; the chosen name is added to it.
+    """
+    name = p.name
+    if name not in existing:
+        existing.add(name)
         return p
+
     stem, suf = p.stem, p.suffix
     i = 2
     while True:
-        cand = p.with_name(f"{stem}__{i}{suf}")
-        if not cand.exists():
-            return cand
+        name = f"{stem}__{i}{suf}"
+        if name not in existing:
+            existing.add(name)
+            return p.with_name(name)
         i += 1
 
 
-def find_by_stem(folder: Path, stem: str) -> Optional[Path]:
-    for p in folder.iterdir():
-        if p.is_file() and p.stem.lower() == stem.lower():
-            return p
-    return None
+@dataclass
+class FolderIndex:
+    """
+    One os.scandir() pass over a piece folder.
+    exact: file name -> entry (all entries); tried for every candidate before any case-insensitive match
+    names: lowercased file name -> entry; case-insensitive fallback (smallest name wins on collisions)
+    stems: lowercased stem -> regular file with that stem (smallest name wins on collisions)
+    taken: names on disk plus names reserved by planned renames
+    """
+    folder: Path
+    exact: Dict[str, os.DirEntry]
+    names: Dict[str, os.DirEntry]
+    stems: Dict[str, os.DirEntry]
+    taken: Set[str]
+
+    def has(self, name: str) -> bool:
+        """Exact-name check, like Path.exists() on a case-sensitive filesystem."""
+        return name in self.exact
+
+    def first(self, *names: str) -> Optional[os.DirEntry]:
+        """
+        Entry for the first of names present in the folder, if any.
+        All names are tried exactly before any of them case-insensitively.
+        """
+        for name in names:
+            e = self.exact.get(name)
+            if e is not None:
+                return e
+        for name in names:
+            e = self.names.get(name.lower())
+            if e is not None:
+                return e
+        return None
+
+
+def index_folder(folder: Path) -> FolderIndex:
+    with os.scandir(folder) as it:
+        exact = {e.name: e for e in it}
+    names: Dict[str, os.DirEntry] = {}
+    stems: Dict[str, os.DirEntry] = {}
+    # sorted, so case-colliding names resolve the same way whatever order scandir returns
+    for name in sorted(exact):
+        e = exact[name]
+        names.setdefault(name.lower(), e)
+        if e.is_file():
+            stems.setdefault(os.path.splitext(name)[0].lower(), e)
+    return FolderIndex(folder, exact, names, stems, set(exact))
+
+
+def index_piece_dirs(pieces_dir: Path) -> Dict[str, Path]:
+    """short_id -> piece folder, from one os.scandir() pass over the pieces dir."""
+    with os.scandir(pieces_dir) as it:
+        return {e.name: Path(e.path) for e in it if e.is_dir()}
+
+
+def pick_asset(index: FolderIndex, stem: str, preferred_exts: Tuple[str, ...]) -> Optional[os.DirEntry]:
+    """"<stem><ext>" for the first preferred ext present, else any file with that stem."""
+    return index.first(*(stem + ext for ext in preferred_exts)) or index.stems.get(stem.lower())
+
+
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _renameat2() -> Any:
+    """(libc renameat2(), ctypes.get_errno) via ctypes (Linux, glibc >= 2.28), or None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        fn = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    fn.restype = ctypes.c_int
+    return fn, ctypes.get_errno
+
+
+def rename_noreplace(src: str, dst: str) -> bool:
+    """
+    Rename src -> dst unless dst already exists. Returns False (and does nothing) if it does.
+    On Linux this is a single atomic renameat2(RENAME_NOREPLACE) syscall;
+    elsewhere, or if the filesystem does not support the flag, exists() + rename().
+    """
+    r = _renameat2()
+    if r is not None:
+        fn, get_errno = r
+        if fn(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return True
+        err = get_errno()
+        if err == errno.EEXIST:
+            return False
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), src, None, dst)
+        # flag unsupported here: fall through
+
+    if os.path.lexists(dst):
+        return False
+    os.rename(src, dst)
+    return True
 
 
 def ensure_compat_link(old_path: Path, new_path: Path) -> None:
     """
     Create a hardlink (preferred) or symlink at old_path pointing to new_path.
     """
-    if old_path.exists():
+    # lexists: a (possibly dangling) link from an earlier run counts as present
+    if os.path.lexists(old_path):
         return
 
     try:
@@ -103,8 +406,9 @@ def ensure_compat_link(old_path: Path, new_path: Path) -> None:
         pass
 
     try:
-        rel = os.path.relpath(new_path, start=old_path.parent)
-        os.symlink(rel, old_path)
+        # rename ops never leave the piece folder, so the relative target is just the name
+        assert old_path.parent == new_path.parent
+        os.symlink(new_path.name, old_path)
         return
     except Exception as e:
         raise RuntimeError(f"Could not create compat link {old_path.name} -> {new_path.name}: {e}") from e
@@ -116,31 +420,31 @@ def ensure_compat_link(old_path: Path, new_path: Path) -> None:
 def build_comment(description: Optional[str], collaborators: Optional[List[str]], username: Optional[str]) -> str:
     desc = (description or "").rstrip()
 
-    user_norm = (username or "").strip().casefold()
     cols_raw = collaborators or []
+    if not cols_raw:
+        return desc
 
-    cols: List[str] = []
-    seen: set[str] = set()
-    for c in cols_raw:
-        if not c:
-            continue
-        c_clean = str(c).strip()
-        if not c_clean:
-            continue
-        c_norm = c_clean.casefold()
-
-        # drop own username
-        if user_norm and c_norm == user_norm:
-            continue
-
-        # de-duplicate (preserve order)
-        if c_norm in seen:
-            continue
-        seen.add(c_norm)
-        cols.append(c_clean)
+    user_norm = (username or "").strip().casefold()
 
-    if not cols:
-        return desc
+    if len(cols_raw) == 1:
+        # common case: a single collaborator, nothing to de-duplicate
+        c = cols_raw[0]
+        c_clean = str(c).strip() if c else ""
+        if not c_clean or c_clean.casefold() == user_norm:
+            return desc
+        cols = [c_clean]
+    else:
+        # casefolded name -> first spelling seen (dict keeps insertion order)
+        cols_by_norm: Dict[str, str] = {}
+        for c in cols_raw:
+            c_clean = str(c).strip() if c else ""
+            c_norm = c_clean.casefold()
+            # drop empties and own username; de-duplicate (preserve order)
+            if c_norm and c_norm != user_norm:
+                cols_by_norm.setdefault(c_norm, c_clean)
+        if not cols_by_norm:
+            return desc
+        cols = list(cols_by_norm.values())
 
     tail = "Collaborators:\n" + "\n".join(cols)
     return (desc + "\n\n" + tail) if desc else tail
@@ -162,11 +466,21 @@ def parse_tempo_to_tmpo(tempo_value: Any) -> Optional[int]:
         return None
 
 
+def print_warnings(warnings: List[str]) -> None:
+    sys.stdout.write("".join(f"WARN: {w}\n" for w in warnings))
+
+
 # -------------------------
 # Rename command
 # -------------------------
+LOG_BATCH = 128  # rename log entries buffered before each write
+
+
 @dataclass
 class RenameOp:
+    # explicit __slots__ (dataclass(slots=True) needs 3.10): no per-op __dict__
+    __slots__ = ("kind", "short_id", "title", "src", "dst", "keep_mode")
+
     kind: str  # audio / cover / attachment
     short_id: str
     title: str
@@ -174,19 +488,25 @@ class RenameOp:
     dst: Path
     keep_mode: str  # "none" | "link" | "copy"
 
-    def to_json(self) -> Dict[str, Any]:
-        return {
+    def to_jsonl_bytes(self) -> bytes:
+        """One rename-log line (UTF-8 JSON + newline)."""
+        return json_dumpb({
             "kind": self.kind,
             "short_id": self.short_id,
             "title": self.title,
-            "src": str(self.src),
-            "dst": str(self.dst),
+            "src": os.fspath(self.src),
+            "dst": os.fspath(self.dst),
             "keep_mode": self.keep_mode,
-        }
+        }) + b"\n"
+
+
+SCAN_WORKERS = min(32, (os.cpu_count() or 4) * 4)
+SCAN_WINDOW = 256  # pieces scanned per batch (bounds memory when pieces are streamed)
+SCAN_CHUNK = 16  # pieces per thread-pool task
 
 
 def build_rename_ops(
-    pieces: List[Dict[str, Any]],
+    pieces: Iterable[Dict[str, Any]],
     pieces_dir: Path,
     username: str,
     preserve_blanks: bool,
@@ -195,65 +515,103 @@ def build_rename_ops(
     warnings: List[str] = []
 
     username_clean = safe_filename_base(username, preserve_blanks=preserve_blanks)
+    piece_dirs = index_piece_dirs(pieces_dir)
+    scan = functools.partial(
+        _ops_for_pieces,
+        username_clean=username_clean,
+        preserve_blanks=preserve_blanks,
+        keep_mode=keep_mode,
+    )
 
-    for piece in pieces:
-        sid = piece.get("short_id")
-        title = piece.get("title") or "untitled"
-        attach = piece.get("attachment")  # e.g. "piece.figure" or null
+    # Folder scans are I/O-bound and independent per piece (each piece only
+    # touches its own folder index), so threads overlap the syscalls. Pieces
+    # that need no scan are settled here; the rest go out SCAN_CHUNK at a time
+    # so per-task overhead stays small. Results are collected in metadata order.
+    it = iter(pieces)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN_WORKERS) as ex:
+        while True:
+            batch = list(itertools.islice(it, SCAN_WINDOW))
+            if not batch:
+                break
+            slots: List[Tuple[List[RenameOp], List[str]]] = [([], [])] * len(batch)
+            todo: List[Tuple[int, Dict[str, Any], str, Path]] = []
+            for i, piece in enumerate(batch):
+                sid = piece.get("short_id")
+                if not sid:
+                    slots[i] = ([], ["Piece without short_id in metadata; skipping."])
+                    continue
+                folder = piece_dirs.get(sid)
+                if folder is None:
+                    slots[i] = ([], [f"[{sid}] Folder missing: {pieces_dir / sid}"])
+                    continue
+                todo.append((i, piece, sid, folder))
+
+            chunks = [todo[j:j + SCAN_CHUNK] for j in range(0, len(todo), SCAN_CHUNK)]
+            for chunk, results in zip(chunks, ex.map(scan, chunks)):
+                for (i, *_), r in zip(chunk, results):
+                    slots[i] = r
+
+            for piece_ops, piece_warnings in slots:
+                ops.extend(piece_ops)
+                warnings.extend(piece_warnings)
 
-        if not sid:
-            warnings.append("Piece without short_id in metadata; skipping.")
-            continue
+    return ops, warnings
 
-        folder = pieces_dir / sid
-        if not folder.exists():
-            warnings.append(f"[{sid}] Folder missing: {folder}")
-            continue
 
-        base = safe_filename_base(f"{username_clean} - {title}", preserve_blanks=preserve_blanks)
+def _ops_for_pieces(
+    chunk: List[Tuple[int, Dict[str, Any], str, Path]],
+    **kw: Any) -> List[Tuple[List[RenameOp], List[str]]]:
+    return [_ops_for_piece(piece, sid, folder, **kw) for _, piece, sid, folder in chunk]
 
-        # AUDIO: prefer common names / stem "audio"
-        audio_src: Optional[Path] = None
-        for cand in [folder / "audio.mp4", folder / "audio.m4a", folder / "audio.wav", folder / "audio.aac"]:
-            if cand.exists():
-                audio_src = cand
-                break
-        if audio_src is None:
-            audio_src = find_by_stem(folder, "audio")
 
-        if audio_src:
-            dst = folder / f"{base}{audio_src.suffix}"
-            if audio_src.name != dst.name and not dst.exists():
-                ops.append(RenameOp("audio", sid, title, audio_src, unique_path(dst), keep_mode))
-        else:
-            warnings.append(f"[{sid}] audio file not found (expected stem 'audio')")
+def _ops_for_piece(
+    piece: Dict[str, Any],
+    sid: str,
+    folder: Path,
+    *,
+    username_clean: str,
+    preserve_blanks: bool,
+    keep_mode: str) -> Tuple[List[RenameOp], List[str]]:
+    ops: List[RenameOp] = []
+    warnings: List[str] = []
 
-        # COVER: prefer cover.{jpg,jpeg,png} / stem "cover"
-        cover_src: Optional[Path] = None
-        for cand in [folder / "cover.jpg", folder / "cover.jpeg", folder / "cover.png"]:
-            if cand.exists():
-                cover_src = cand
-                break
-        if cover_src is None:
-            cover_src = find_by_stem(folder, "cover")
-
-        if cover_src:
-            # New naming: "<username> - <title>.cover.<ext>"
-            dst = folder / f"{base}.cover{cover_src.suffix}"
-            if cover_src.name != dst.name and not dst.exists():
-                ops.append(RenameOp("cover", sid, title, cover_src, unique_path(dst), keep_mode))
+    title = piece.get("title") or "untitled"
+    attach = piece.get("attachment")  # e.g. "piece.figure" or null
+
+    base = safe_filename_base(f"{username_clean} - {title}", preserve_blanks=preserve_blanks)
+    index = index_folder(folder)
+
+    # Candidates stay DirEntry/str until an op is emitted; only then are Paths built.
+    # AUDIO: prefer common names / stem "audio"
+    audio_src = pick_asset(index, "audio", (".mp4", ".m4a", ".wav", ".aac"))
+
+    if audio_src:
+        dst_name = base + os.path.splitext(audio_src.name)[1]
+        if audio_src.name != dst_name and not index.has(dst_name):
+            ops.append(RenameOp("audio", sid, title, Path(audio_src.path), unique_path(folder / dst_name, index.taken), keep_mode))
+    else:
+        warnings.append(f"[{sid}] audio file not found (expected stem 'audio')")
+
+    # COVER: prefer cover.{jpg,jpeg,png} / stem "cover"
+    cover_src = pick_asset(index, "cover", COVER_EXTS)
+
+    if cover_src:
+        # New naming: "<username> - <title>.cover.<ext>"
+        dst_name = base + ".cover" + os.path.splitext(cover_src.name)[1]
+        if cover_src.name != dst_name and not index.has(dst_name):
+            ops.append(RenameOp("cover", sid, title, Path(cover_src.path), unique_path(folder / dst_name, index.taken), keep_mode))
+    else:
+        warnings.append(f"[{sid}] cover file not found (expected stem 'cover')")
+
+    # ATTACHMENT (optional)
+    if isinstance(attach, str) and (attach_name := attach.strip()):
+        attach_src = index.first(attach_name)
+        if attach_src:
+            dst_name = base + os.path.splitext(attach_src.name)[1]
+            if attach_src.name != dst_name and not index.has(dst_name):
+                ops.append(RenameOp("attachment", sid, title, Path(attach_src.path), unique_path(folder / dst_name, index.taken), keep_mode))
         else:
-            warnings.append(f"[{sid}] cover file not found (expected stem 'cover')")
-
-        # ATTACHMENT (optional)
-        if isinstance(attach, str) and attach.strip():
-            attach_src = folder / attach
-            if attach_src.exists():
-                dst = folder / f"{base}{attach_src.suffix}"
-                if attach_src.name != dst.name and not dst.exists():
-                    ops.append(RenameOp("attachment", sid, title, attach_src, unique_path(dst), keep_mode))
-            else:
-                warnings.append(f"[{sid}] attachment listed in metadata but missing: {attach}")
+            warnings.append(f"[{sid}] attachment listed in metadata but missing: {attach}")
 
     return ops, warnings
 
@@ -267,41 +625,56 @@ def apply_rename_ops(ops: List[RenameOp], log_path: Path, dry_run: bool) -> None
         return
 
     if dry_run:
+        # collected and written in one go; dry-runs over large archives are often piped
+        out: List[str] = []
         for op in ops:
-            print(f"  [{op.short_id}] {op.kind}: {op.src.name} -> {op.dst.name}")
-            if op.keep_mode == "link":  
-                print(f"             keep: would keep '{op.src.name}' as a link to '{op.dst.name}'")
+            src_name, dst_name = op.src.name, op.dst.name
+            out.append(f"  [{op.short_id}] {op.kind}: {src_name} -> {dst_name}\n")
+            if op.keep_mode == "link":
+                out.append(f"             keep: would keep '{src_name}' as a link to '{dst_name}'\n")
             elif op.keep_mode == "copy":
-                print(f"             keep: would keep '{op.src.name}' as a copy of '{op.dst.name}'")
-                
-        print("(No changes made. Use --apply to execute.)")                
-        return
+                out.append(f"             keep: would keep '{src_name}' as a copy of '{dst_name}'\n")
 
-    with log_path.open("a", encoding="utf-8") as f:
-        for op in ops:
-            if op.dst.exists():
-                print(f"  SKIP exists: {op.dst}")
-                continue
+        out.append("(No changes made. Use --apply to execute.)\n")
+        sys.stdout.write("".join(out))
+        return
 
-            old_path = op.src
-            new_path = op.dst
+    # Log lines are written in blocks instead of flushed per op; the finally
+    # clause makes sure entries for renames already done reach the log, and
+    # syncs it to disk once per run so undo can rely on it.
+    lines: List[bytes] = []
+    with log_path.open("ab", buffering=1 << 16) as f:
+        try:
+            for op in ops:
+                src_s, dst_s = os.fspath(op.src), os.fspath(op.dst)
+                if not rename_noreplace(src_s, dst_s):
+                    print(f"  SKIP exists: {dst_s}")
+                    continue
 
-            print(f"  DO   [{op.short_id}] {op.kind}: {old_path.name} -> {new_path.name}")
-            old_path.rename(new_path)
+                old_path = op.src
+                new_path = op.dst
 
-            if op.keep_mode == "link":
-                try:
-                    ensure_compat_link(old_path, new_path)
-                except Exception as e:
-                    print(f"  WARN keep link failed for {old_path.name}: {e}")
-            elif op.keep_mode == "copy":
-                try:
-                    ensure_compat_copy(old_path, new_path)
-                except Exception as e:
-                    print(f"  WARN keep copy failed for {old_path.name}: {e}")
+                print(f"  DO   [{op.short_id}] {op.kind}: {old_path.name} -> {new_path.name}")
 
-            f.write(json.dumps(op.to_json(), ensure_ascii=False) + "\n")
+                if op.keep_mode == "link":
+                    try:
+                        ensure_compat_link(old_path, new_path)
+                    except Exception as e:
+                        print(f"  WARN keep link failed for {old_path.name}: {e}")
+                elif op.keep_mode == "copy":
+                    try:
+                        ensure_compat_copy(old_path, new_path)
+                    except Exception as e:
+                        print(f"  WARN keep copy failed for {old_path.name}: {e}")
+
+                lines.append(op.to_jsonl_bytes())
+                if len(lines) >= LOG_BATCH:
+                    f.write(b"".join(lines))
+                    lines.clear()
+        finally:
+            f.write(b"".join(lines))
             f.flush()
+            os.fsync(f.fileno())
 
 
 def undo_rename_from_log(log_path: Path, dry_run: bool) -> None:
@@ -309,14 +682,17 @@ def undo_rename_from_log(log_path: Path, dry_run: bool) -> None:
         print(f"Log not found: {log_path}")
         return
 
+    lines = [line for line in (l.strip() for l in log_path.read_bytes().splitlines()) if line]
+
+    # Parse all entries in one call; only if some line is broken (e.g. a run
+    # interrupted mid-write) fall back to per-line parsing and skip the bad ones.
     entries: List[Dict[str, Any]] = []
-    with log_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    try:
+        entries = json_loads(b"[" + b",".join(lines) + b"]")
+    except Exception:
+        for line in lines:
             try:
-                entries.append(json.loads(line))
+                entries.append(json_loads(line))
             except Exception:
                 pass
 
@@ -330,29 +706,29 @@ def undo_rename_from_log(log_path: Path, dry_run: bool) -> None:
     print(f"{mode}: {len(entries)} operation(s) from log")
 
     for e in entries:
-        src = Path(e["src"])  # old name (compat name)
-        dst = Path(e["dst"])  # renamed file (authoritative)
+        src = e["src"]  # old name (compat name)
+        dst = e["dst"]  # renamed file (authoritative)
 
-        if not dst.exists():
+        if not os.path.exists(dst):
             # We assume dst is the authoritative "good" file; if it's missing we can't restore safely.
             print(f"  WARN dst missing, skipping: {dst}")
             continue
 
         # Delete compat file (if present), regardless of symlink/hardlink/copy.
-        if src.exists() or src.is_symlink():
-            # src.is_symlink() covers broken symlinks on some platforms.
-            if src.is_dir():
+        # lexists() also reports broken symlinks.
+        if os.path.lexists(src):
+            if os.path.isdir(src):
                 print(f"  WARN src is a directory, not deleting: {src}")
             else:
                 print(f"  DEL  {src}")
                 if not dry_run:
                     try:
-                        src.unlink()
+                        os.unlink(src)
                     except PermissionError:
                         # best-effort: clear readonly bit and retry (Windows)
                         try:
                             os.chmod(src, 0o666)
-                            src.unlink()
+                            os.unlink(src)
                         except Exception as ex:
                             print(f"  WARN could not delete {src}: {ex}")
                     except Exception as ex:
@@ -363,7 +739,7 @@ def undo_rename_from_log(log_path: Path, dry_run: bool) -> None:
         print(f"  MOVE {dst} -> {src}")
         if not dry_run:
             try:
-                dst.rename(src)
+                os.rename(dst, src)
             except Exception as ex:
                 print(f"  WARN could not rename {dst} -> {src}: {ex}")
     
@@ -371,58 +747,79 @@ def undo_rename_from_log(log_path: Path, dry_run: bool) -> None:
 # -------------------------
 # Tag command
 # -------------------------
-AUDIO_EXTS = (".mp4", ".m4a", ".aac")
+AUDIO_EXTS = (".mp4", ".m4a", ".aac")  # in lookup priority order
 COVER_EXTS = (".jpg", ".jpeg", ".png")
+AUDIO_EXT_SET = frozenset(AUDIO_EXTS)  # for membership tests
+COVER_EXT_SET = frozenset(COVER_EXTS)
+ALLTIHOP_JSON_KEY = "----:com.apple.iTunes:alltihop_json"
 
+_MUTAGEN: Optional[Tuple[Any, Any, Any]] = None
 
-def find_audio_file(folder: Path, base: str) -> Optional[Path]:
-    # 1) Prefer renamed form "<base>.<ext>"
-    for ext in AUDIO_EXTS:
-        p = folder / f"{base}{ext}"
-        if p.exists():
-            return p
 
+def _mutagen() -> Tuple[Any, Any, Any]:
+    """(MP4, MP4Cover, MP4FreeForm), imported on first use."""
+    global _MUTAGEN
+    if _MUTAGEN is None:
+        try:
+            from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm  # type: ignore
+        except Exception as e:
+            raise RuntimeError(
+                "Tagging requires the 'mutagen' package. Install it via:\n"
+                "  python -m pip install mutagen\n"
+                f"Import error: {e}"
+            ) from e
+        _MUTAGEN = (MP4, MP4Cover, MP4FreeForm)
+    return _MUTAGEN
+
+
+def find_audio_file(index: FolderIndex, base: str) -> Optional[Path]:
+    # 1) Prefer renamed form "<base>.<ext>"
     # 2) Fallback: legacy "audio.*" / stem audio
-    for ext in (".mp4", ".m4a", ".aac", ".wav", ".flac", ".mp3", ".ogg"):
-        p = folder / f"audio{ext}"
-        if p.exists():
-            return p
-    p = find_by_stem(folder, "audio")
-    if p:
-        return p
+    e = (index.first(*(base + ext for ext in AUDIO_EXTS))
+         or pick_asset(index, "audio", (".mp4", ".m4a", ".aac", ".wav", ".flac", ".mp3", ".ogg")))
+    if e:
+        return Path(e.path)
 
     # 3) If exactly one MP4/M4A in folder, use it
-    candidates = [p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in AUDIO_EXTS]
+    candidates = [e for e in index.exact.values() if os.path.splitext(e.name)[1].lower() in AUDIO_EXT_SET and e.is_file()]
     if len(candidates) == 1:
-        return candidates[0]
+        return Path(candidates[0].path)
 
     return None
 
 
-def find_cover_file(folder: Path, base: str) -> Optional[Path]:
+def find_cover_file(index: FolderIndex, base: str) -> Optional[Path]:
     # 1) Prefer renamed form "<base>.cover.<ext>"
-    for ext in COVER_EXTS:
-        p = folder / f"{base}.cover{ext}"
-        if p.exists():
-            return p
-
     # 2) Fallback: legacy "cover.*" / stem cover
-    for ext in COVER_EXTS:
-        p = folder / f"cover{ext}"
-        if p.exists():
-            return p
-    p = find_by_stem(folder, "cover")
-    if p:
-        return p
+    e = (index.first(*(f"{base}.cover{ext}" for ext in COVER_EXTS))
+         or pick_asset(index, "cover", COVER_EXTS))
+    if e:
+        return Path(e.path)
 
     # 3) If exactly one image in folder, use it
-    candidates = [p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in COVER_EXTS]
+    candidates = [e for e in index.exact.values() if os.path.splitext(e.name)[1].lower() in COVER_EXT_SET and e.is_file()]
     if len(candidates) == 1:
-        return candidates[0]
+        return Path(candidates[0].path)
 
     return None
 
 
+TAG_PADDING = 16 * 1024  # free space reserved after ilst when the tag block has to grow
+
+
+def _tag_padding(info: Any) -> int:
+    """
+    mutagen save() padding callback.
+    mutagen rewrites ilst in place when it fits into the adjacent 'free' atom;
+    only a size change of ilst+free shifts the audio data behind it. So: keep any
+    existing padding as is, and when growing reserve enough that re-runs
+    (e.g. an edited description in alltihop_json) still fit in place.
+    """
+    if info.padding >= 0:
+        return info.padding
+    return max(info.get_default_padding(), TAG_PADDING)
+
+
 def write_meta_file(meta_path: Path, piece: Dict[str, Any], *, overwrite: bool) -> None:
     if meta_path.exists() and not overwrite:
         return
@@ -439,172 +836,297 @@ def tag_mp4_file(
     tempo_value: Any,
     cover_path: Optional[Path],
     alltihop_piece_json: Dict[str, Any],
-) -> None:
+    force: bool = False,
+) -> bool:
     """
     Writes MP4/M4A tags and embeds cover art (if provided) using mutagen.
     Also writes a freeform custom tag:
       ----:com.apple.iTunes:alltihop_json = <full piece JSON as UTF-8>
+    The file is only saved if a tag actually changes (or force=True).
+    Returns True if the file was written.
     """
-    try:
-        from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm  # type: ignore
-    except Exception as e:
-        raise RuntimeError(
-            "Tagging requires the 'mutagen' package. Install it via:\n"
-            "  python -m pip install mutagen\n"
-            f"Import error: {e}"
-        ) from e
+    MP4, MP4Cover, MP4FreeForm = _mutagen()
 
     mp4 = MP4(str(audio_path))
     if mp4.tags is None:
         mp4.add_tags()
 
     tags = mp4.tags
+    new_tags: Dict[str, List[Any]] = {}
 
     # Standard-ish fields
-    tags["\xa9nam"] = [title]               # Title
-    tags["\xa9ART"] = [artist]              # Artist
+    new_tags["\xa9nam"] = [title]               # Title
+    new_tags["\xa9ART"] = [artist]              # Artist
     if comment:
-        tags["\xa9cmt"] = [comment]         # Comment
+        new_tags["\xa9cmt"] = [comment]         # Comment
 
     if created_at:
         # Many tools accept ISO date here; keeping full timestamp is usually fine.
-        tags["\xa9day"] = [created_at]
+        new_tags["\xa9day"] = [created_at]
 
     tmpo = parse_tempo_to_tmpo(tempo_value)
     if tmpo is not None:
-        tags["tmpo"] = [tmpo]
+        new_tags["tmpo"] = [tmpo]
 
     # Cover art
     if cover_path and cover_path.exists():
         b = cover_path.read_bytes()
         suf = cover_path.suffix.lower()
         if suf in (".jpg", ".jpeg"):
-            tags["covr"] = [MP4Cover(b, imageformat=MP4Cover.FORMAT_JPEG)]
+            new_tags["covr"] = [MP4Cover(b, imageformat=MP4Cover.FORMAT_JPEG)]
         elif suf == ".png":
-            tags["covr"] = [MP4Cover(b, imageformat=MP4Cover.FORMAT_PNG)]
+            new_tags["covr"] = [MP4Cover(b, imageformat=MP4Cover.FORMAT_PNG)]
         # else: ignore (shouldn't happen due to finder)
 
     # Custom freeform JSON
-    piece_json_bytes = (json.dumps(alltihop_piece_json, ensure_ascii=False) + "\n").encode("utf-8")
-    tags["----:com.apple.iTunes:alltihop_json"] = [MP4FreeForm(piece_json_bytes)]
+    piece_json_bytes = json_dumpb(alltihop_piece_json) + b"\n"
+    new_tags[ALLTIHOP_JSON_KEY] = [MP4FreeForm(piece_json_bytes)]
+
+    # Re-runs: skip the save (a moov/ilst rewrite) when everything already matches.
+    # MP4Cover/MP4FreeForm are bytes subclasses, so == compares the payload.
+    if not force and all(tags.get(k) == v for k, v in new_tags.items()):
+        return False
+
+    tags.update(new_tags)
+    mp4.save(padding=_tag_padding)
+    return True
+
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
 
-    mp4.save()
+
+def _fast_copy(src: Path, dst: Path) -> bool:
+    """
+    Copy src to dst without moving the bytes through userspace:
+    a reflink clone (FICLONE: Btrfs/XFS) first, then os.copy_file_range.
+    Returns False if neither worked; dst may then be partially written.
+    """
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        fcntl = None
+
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+                return True
+            except OSError:
+                pass
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                left = os.fstat(fs.fileno()).st_size
+                while left > 0:
+                    n = os.copy_file_range(fs.fileno(), fd.fileno(), left)
+                    if n == 0:
+                        break
+                    left -= n
+                return left == 0
+            except OSError:
+                pass
+
+    return False
 
 
 def ensure_compat_copy(old_path: Path, new_path: Path) -> None:
     """
     Create a copy at old_path from new_path.
+    Uses a reflink / in-kernel copy where the filesystem supports it.
     """
-    if old_path.exists():
+    if os.path.lexists(old_path):
         return
+    try:
+        if _fast_copy(new_path, old_path):
+            shutil.copystat(new_path, old_path)
+            return
+    except OSError:
+        pass
     shutil.copy2(new_path, old_path)
 
 
+@dataclass
+class TagJob:
+    """Everything needed to tag one piece; picklable for the process pool."""
+    sid: str
+    audio_path: Path
+    meta_path: Path
+    cover_path: Optional[Path]
+    title: str
+    artist: str
+    comment: str
+    created_at: Optional[str]
+    tempo_value: Any
+    piece: Dict[str, Any]
+    overwrite_meta: bool
+    force: bool
+
+
+def _tag_one(job: TagJob) -> Tuple[bool, Optional[str]]:
+    """
+    Write sidecar + MP4 tags for one piece.
+    Returns (audio file written, error message or None).
+    """
+    try:
+        write_meta_file(job.meta_path, job.piece, overwrite=job.overwrite_meta)
+        saved = tag_mp4_file(
+            job.audio_path,
+            title=job.title,
+            artist=job.artist,
+            comment=job.comment,
+            created_at=job.created_at,
+            tempo_value=job.tempo_value,
+            cover_path=job.cover_path,
+            alltihop_piece_json=job.piece,
+            force=job.force,
+        )
+    except Exception as e:
+        return False, str(e)
+    return saved, None
+
+
+TAG_WORKERS = min(os.cpu_count() or 1, 8)
+# Pieces handed to the pool at a time; bounds how many piece dicts are held
+# in memory when pieces are streamed from a large export.
+TAG_WINDOW = 64
+
+
+def _run_tag_jobs(
+    jobs: List[TagJob],
+    ex: Optional[concurrent.futures.ProcessPoolExecutor],
+    warnings: List[str],
+) -> None:
+    if ex is not None:
+        results = ex.map(_tag_one, jobs, chunksize=4)
+    else:
+        results = map(_tag_one, jobs)
+
+    for job, (saved, err) in zip(jobs, results):
+        if err is not None:
+            warnings.append(f"[{job.sid}] ERROR: {err}")
+        elif saved:
+            print(f"[{job.sid}] OK: tagged {job.audio_path.name} + wrote {job.meta_path.name}")
+        else:
+            print(f"[{job.sid}] OK: tags unchanged in {job.audio_path.name} + wrote {job.meta_path.name}")
+
+
 def cmd_tag(
     *,
-    data: Dict[str, Any],
+    pieces: Iterable[Dict[str, Any]],
     pieces_dir: Path,
     username: str,
     preserve_blanks: bool,
     dry_run: bool,
     overwrite_meta: bool,
+    force_retag: bool = False,
 ) -> int:
-    pieces = data.get("pieces")
-    if not isinstance(pieces, list):
-        print("Invalid metadata: expected key 'pieces' to be a list.")
-        return 2
-        
-        
     mutagen_missing = False
     if dry_run:
         try:
-            from mutagen.mp4 import MP4  # noqa: F401
-        except Exception:
+            _mutagen()
+        except RuntimeError:
             mutagen_missing = True
 
 
     username_clean = safe_filename_base(username, preserve_blanks=preserve_blanks)
+    piece_dirs = index_piece_dirs(pieces_dir)
 
     planned = 0
     warnings: List[str] = []
+    jobs: List[TagJob] = []
+    ex: Optional[concurrent.futures.ProcessPoolExecutor] = None
 
-    for piece in pieces:
-        sid = piece.get("short_id")
-        title = piece.get("title") or "untitled"
-        description = piece.get("description")
-        collaborators = piece.get("collaborators")
-        created_at = piece.get("created_at")
-        tempo_value = piece.get("tempo")
-
-        if not sid:
-            warnings.append("Piece without short_id in metadata; skipping.")
-            continue
+    try:
+        for piece in pieces:
+            sid = piece.get("short_id")
+            title = piece.get("title") or "untitled"
+            description = piece.get("description")
+            collaborators = piece.get("collaborators")
+            created_at = piece.get("created_at")
+            tempo_value = piece.get("tempo")
+
+            if not sid:
+                warnings.append("Piece without short_id in metadata; skipping.")
+                continue
 
-        folder = pieces_dir / sid
-        if not folder.exists():
-            warnings.append(f"[{sid}] Folder missing: {folder}")
-            continue
+            folder = piece_dirs.get(sid)
+            if folder is None:
+                warnings.append(f"[{sid}] Folder missing: {pieces_dir / sid}")
+                continue
 
-        base = safe_filename_base(f"{username_clean} - {title}", preserve_blanks=preserve_blanks)
+            base = safe_filename_base(f"{username_clean} - {title}", preserve_blanks=preserve_blanks)
 
-        audio_path = find_audio_file(folder, base)
-        if not audio_path:
-            warnings.append(f"[{sid}] audio not found; skipping tagging.")
-            continue
+            index = index_folder(folder)
 
-        if audio_path.suffix.lower() not in AUDIO_EXTS:
-            warnings.append(f"[{sid}] audio '{audio_path.name}' is not MP4/M4A/AAC; skipping MP4 tagging.")
-            continue
+            audio_path = find_audio_file(index, base)
+            if not audio_path:
+                warnings.append(f"[{sid}] audio not found; skipping tagging.")
+                continue
 
-        cover_path = find_cover_file(folder, base)
-        if not cover_path:
-            warnings.append(f"[{sid}] cover not found; tagging will proceed without embedded artwork.")
+            if audio_path.suffix.lower() not in AUDIO_EXT_SET:
+                warnings.append(f"[{sid}] audio '{audio_path.name}' is not MP4/M4A/AAC; skipping MP4 tagging.")
+                continue
 
-        meta_path = folder / f"{base}.meta.json"
+            cover_path = find_cover_file(index, base)
+            if not cover_path:
+                warnings.append(f"[{sid}] cover not found; tagging will proceed without embedded artwork.")
 
-        comment = build_comment(
-            description=description if isinstance(description, str) else None,
-            collaborators=collaborators if isinstance(collaborators, list) else None,
-            username=username,
-        )
+            meta_path = folder / f"{base}.meta.json"
 
-        planned += 1
+            comment = build_comment(
+                description=description if isinstance(description, str) else None,
+                collaborators=collaborators if isinstance(collaborators, list) else None,
+                username=username,
+            )
 
-        if dry_run:
-            print(f"[{sid}] TAG: {audio_path.name}")
-            if cover_path:
-                print(f"       cover: {cover_path.name} (will embed)")
-            else:
-                print(f"       cover: (none)")
-            print(f"       meta : {meta_path.name} (will write{' (overwrite)' if overwrite_meta else ''})")
-            # show a short preview of comment
-            if comment:
-                preview = comment.replace("\n", "\\n")
-                if len(preview) > 120:
-                    preview = preview[:120] + "..."
-                print(f"       comment: {preview}")
-            print(f"       custom : ----:com.apple.iTunes:alltihop_json (full piece JSON)")
-            continue
+            planned += 1
+
+            if dry_run:
+                print(f"[{sid}] TAG: {audio_path.name}")
+                if cover_path:
+                    print(f"       cover: {cover_path.name} (will embed)")
+                else:
+                    print(f"       cover: (none)")
+                print(f"       meta : {meta_path.name} (will write{' (overwrite)' if overwrite_meta else ''})")
+                # show a short preview of comment
+                if comment:
+                    preview = comment.replace("\n", "\\n")
+                    if len(preview) > 120:
+                        preview = preview[:120] + "..."
+                    print(f"       comment: {preview}")
+                print(f"       custom : {ALLTIHOP_JSON_KEY} (full piece JSON)")
+                continue
 
-        # APPLY
-        try:
-            write_meta_file(meta_path, piece, overwrite=overwrite_meta)
-            tag_mp4_file(
-                audio_path,
+            # APPLY (deferred: pieces are tagged in parallel, one window at a time)
+            jobs.append(TagJob(
+                sid=sid,
+                audio_path=audio_path,
+                meta_path=meta_path,
+                cover_path=cover_path,
                 title=title,
                 artist=username,
                 comment=comment,
                 created_at=created_at if isinstance(created_at, str) else None,
                 tempo_value=tempo_value,
-                cover_path=cover_path,
-                alltihop_piece_json=piece,
-            )
-            print(f"[{sid}] OK: tagged {audio_path.name} + wrote {meta_path.name}")
-        except Exception as e:
-            warnings.append(f"[{sid}] ERROR: {e}")
-
-    for w in warnings:
-        print(f"WARN: {w}")
+                piece=piece,
+                overwrite_meta=overwrite_meta,
+                force=force_retag,
+            ))
+            if len(jobs) >= TAG_WINDOW:
+                if ex is None and TAG_WORKERS > 1:
+                    ex = concurrent.futures.ProcessPoolExecutor(max_workers=TAG_WORKERS)
+                _run_tag_jobs(jobs, ex, warnings)
+                jobs.clear()
+
+        if jobs:
+            if ex is None and min(TAG_WORKERS, len(jobs)) > 1:
+                ex = concurrent.futures.ProcessPoolExecutor(max_workers=min(TAG_WORKERS, len(jobs)))
+            _run_tag_jobs(jobs, ex, warnings)
+    finally:
+        if ex is not None:
+            ex.shutdown()
+
+    print_warnings(warnings)
 
     if dry_run:
         print(f"DRY-RUN: planned tagging for {planned} piece(s). Use --apply to execute.")
@@ -682,6 +1204,8 @@ def build_cli() -> argparse.ArgumentParser:
     ap_t.add_argument("--dry-run", action="store_true", help="Force dry-run")
     ap_t.add_argument("--no-overwrite-meta", action="store_true",
                       help="Do not overwrite existing *.meta.json files.")
+    ap_t.add_argument("--force-retag", action="store_true",
+                      help="Rewrite MP4 tags even if the file already carries identical tags.")
 
     return ap
 
@@ -702,9 +1226,11 @@ def main() -> int:
         print(f"Pieces dir not found: {pieces_dir}")
         return 2
 
-    data = load_alltihop_json(meta_path)
-
-    meta_user = (data.get("user") or {})
+    try:
+        meta_user = read_user(meta_path)
+    except ValueError as e:
+        print(f"Invalid metadata: {e}.")
+        return 2
     default_username = meta_user.get("username") or meta_user.get("display_name") or "unknown"
     username = args.username or default_username
 
@@ -716,27 +1242,32 @@ def main() -> int:
             undo_rename_from_log(log_path, dry_run=dry_run)
             return 0
 
-        pieces = data.get("pieces")
-        if not isinstance(pieces, list):
-            print("Invalid metadata: expected key 'pieces' to be a list.")
-            return 2
-
         keep_mode = "none"
         if args.keep_link:
             keep_mode = "link"
         elif args.keep_copy:
             keep_mode = "copy"
 
-        ops, warnings = build_rename_ops(
-            pieces,
-            pieces_dir,
-            username=username,
-            preserve_blanks=args.preserve_blanks,
-            keep_mode=keep_mode,
-        )
+        try:
+            pieces = iter_pieces(meta_path)
+        except ValueError as e:
+            print(f"Invalid metadata: {e}.")
+            return 2
 
-        for w in warnings:
-            print(f"WARN: {w}")
+        try:
+            ops, warnings = build_rename_ops(
+                pieces,
+                pieces_dir,
+                username=username,
+                preserve_blanks=args.preserve_blanks,
+                keep_mode=keep_mode,
+            )
+        except MetadataError as e:
+            # nothing has been renamed yet: ops are only applied after planning
+            print(f"Invalid metadata: {e}.")
+            return 2
+
+        print_warnings(warnings)
 
         apply_rename_ops(ops, log_path=log_path, dry_run=dry_run)
 
@@ -748,14 +1279,27 @@ def main() -> int:
         dry_run = args.dry_run or (not args.apply)
         overwrite_meta = not args.no_overwrite_meta
 
-        return cmd_tag(
-            data=data,
-            pieces_dir=pieces_dir,
-            username=username,
-            preserve_blanks=args.preserve_blanks,
-            dry_run=dry_run,
-            overwrite_meta=overwrite_meta,
-        )
+        try:
+            # --apply writes files batch by batch, so the whole export is checked up front
+            pieces = iter_pieces(meta_path, check_all=not dry_run)
+        except ValueError as e:
+            print(f"Invalid metadata: {e}.")
+            return 2
+
+        try:
+            return cmd_tag(
+                pieces=pieces,
+                pieces_dir=pieces_dir,
+                username=username,
+                preserve_blanks=args.preserve_blanks,
+                dry_run=dry_run,
+                overwrite_meta=overwrite_meta,
+                force_retag=args.force_retag,
+            )
+        except MetadataError as e:
+            # only reachable in dry-run mode (see check_all above)
+            print(f"Invalid metadata: {e}.")
+            return 2
 
     print("Unknown command.")
     return 2